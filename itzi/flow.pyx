@@ -21,8 +21,10 @@ from libc.math cimport pow as c_pow
 from libc.math cimport sqrt as c_sqrt
 from libc.math cimport fabs as c_abs
 from libc.math cimport atan2 as c_atan
+from libc.math cimport isnan as c_isnan
 
 ctypedef np.float32_t DTYPE_t
+ctypedef np.int8_t DIR_t
 cdef float PI = 3.1415926535898
 
 
@@ -34,7 +36,7 @@ def arr_sum(DTYPE_t [:, :] arr):
     cdef float asum = 0.
     rmax = arr.shape[0]
     cmax = arr.shape[1]
-    for r in prange(rmax, nogil=True):
+    for r in prange(rmax, nogil=True, schedule='static'):
         for c in range(cmax):
             asum += arr[r, c]
     return asum
@@ -47,7 +49,7 @@ def arr_add(DTYPE_t [:, :] arr1, DTYPE_t [:, :] arr2):
     cdef int rmax, cmax, r, c
     rmax = arr1.shape[0]
     cmax = arr1.shape[1]
-    for r in prange(rmax, nogil=True):
+    for r in prange(rmax, nogil=True, schedule='static'):
         for c in range(cmax):
             arr2[r, c] += arr1[r, c]
 
@@ -64,53 +66,61 @@ def apply_hydrology(DTYPE_t [:, :] arr_rain, DTYPE_t [:, :] arr_inf,
     cdef float rain, etp, inf, capped_losses, dt_h, h_new
     rmax = arr_rain.shape[0]
     cmax = arr_rain.shape[1]
-    for r in prange(rmax, nogil=True):
+    dt_h = dt / 3600.  # dt from sec to hours
+    for r in prange(rmax, nogil=True, schedule='static'):
         for c in range(cmax):
             rain = arr_rain[r, c]
             inf = arr_inf[r, c]
             etp = arr_etp[r, c]
             capped_losses = arr_capped_losses[r, c]
-            dt_h = dt / 3600.  # dt from sec to hours
             h_new = max(arr_h[r, c] + (rain - inf - etp - capped_losses) * dt_h / 1000., 0.)
             arr_h[r, c] = h_new
 
 
 @cython.wraparound(False)  # Disable negative index check
 @cython.boundscheck(False)  # turn off bounds-checking for entire function
-def flow_dir(DTYPE_t [:, :] arr_max_dz, DTYPE_t [:, :] arr_dz0,
-             DTYPE_t [:, :] arr_dz1, DTYPE_t [:, :] arr_dir):
-    '''Populate arr_dir with a rain-routing direction:
+def flow_dir(DTYPE_t [:, :] arrp_z, DIR_t [:, :] arr_dire,
+             DIR_t [:, :] arr_dirs):
+    '''Populate arr_dire and arr_dirs with a rain-routing direction code,
+    following the steepest descent from the padded DEM arrp_z:
     0: the flow is going dowstream, index-wise
     1: the flow is going upstream, index-wise
     -1: no routing happening on that face
     '''
-    cdef int rmax, cmax, r, c
-    cdef float max_dz, dz0, dz1, qdir
-    rmax = arr_max_dz.shape[0]
-    cmax = arr_max_dz.shape[1]
-    for r in prange(rmax, nogil=True):
+    cdef int rmax, cmax, r, c, rp, cp
+    cdef float z0, dz_n, dz_s, dz_e, dz_w, max_dz
+    rmax = arr_dire.shape[0]
+    cmax = arr_dire.shape[1]
+    for r in prange(rmax, nogil=True, schedule='static'):
         for c in range(cmax):
-            max_dz = arr_max_dz[r, c]
-            dz0 = arr_dz0[r, c]
-            dz1 = arr_dz1[r, c]
-            qdir = arr_dir[r, c]
-            if max_dz > 0:
-                if max_dz == dz0:
-                    qdir = 0
-                elif max_dz == dz1:
-                    qdir = 1
-                else:
-                    qdir = -1
-            else:
-                qdir = -1
-            # update results array
-            arr_dir[r, c] = qdir
+            rp = r + 1
+            cp = c + 1
+            z0 = arrp_z[rp, cp]
+            dz_n = z0 - arrp_z[rp-1, cp]
+            dz_s = z0 - arrp_z[rp+1, cp]
+            dz_e = z0 - arrp_z[rp, cp+1]
+            dz_w = z0 - arrp_z[rp, cp-1]
+            # maximum altitude difference
+            max_dz = max(max(dz_n, dz_s), max(dz_e, dz_w))
+            arr_dirs[r, c] = dir_code(max_dz, dz_n, dz_s)
+            arr_dire[r, c] = dir_code(max_dz, dz_w, dz_e)
+
+
+cdef DIR_t dir_code(float max_dz, float dz0, float dz1) nogil:
+    """Return the routing direction code of a face
+    """
+    if max_dz > 0:
+        if max_dz == dz0:
+            return 0
+        elif max_dz == dz1:
+            return 1
+    return -1
 
 
 @cython.wraparound(False)  # Disable negative index check
 @cython.cdivision(True)  # Don't check division by zero
 @cython.boundscheck(False)  # turn off bounds-checking for entire function
-def solve_q(DTYPE_t [:, :] arr_dire, DTYPE_t [:, :] arr_dirs,
+def solve_q(DIR_t [:, :] arr_dire, DIR_t [:, :] arr_dirs,
             DTYPE_t [:, :] arr_z, DTYPE_t [:, :] arr_n, DTYPE_t [:, :] arr_h,
             DTYPE_t [:, :] arrp_qe, DTYPE_t [:, :] arrp_qs,
             DTYPE_t [:, :] arr_hfe, DTYPE_t [:, :] arr_hfs,
@@ -122,12 +132,13 @@ def solve_q(DTYPE_t [:, :] arr_dire, DTYPE_t [:, :] arr_dirs,
 
     cdef int rmax, cmax, r, c, rp, cp
     cdef float wse_e, wse_s, wse0, z0, ze, zs, n0, n, ne, ns
-    cdef float qe_st, qs_st, qe, qs, qe_vect, qs_vect, qdire, qdirs
+    cdef float qe_st, qs_st, qe, qs, qe_vect, qs_vect
+    cdef DIR_t qdire, qdirs
     cdef float qe_new, qs_new, hf_e, hf_s, h0, h_e, h_s
 
     rmax = arr_z.shape[0]
     cmax = arr_z.shape[1]
-    for r in prange(rmax, nogil=True):
+    for r in prange(rmax, nogil=True, schedule='static'):
         for c in range(cmax):
             rp = r + 1
             cp = c + 1
@@ -167,12 +178,12 @@ def solve_q(DTYPE_t [:, :] arr_dire, DTYPE_t [:, :] arr_dirs,
                                          qm1=arrp_qe[rp,cp-1], q0=qe,
                                          qp1=arrp_qe[rp,cp+1], q_norm=qe_vect,
                                          theta=theta, g=g, dt=dt, cell_len=dx)
-                # flow routing going W, i.e negative
-                elif hf_e <= hf_min and qdire == 0 and wse_e > wse0:
+                # below hf_min: rain routing. flow going W, i.e negative
+                elif qdire == 0 and wse_e > wse0:
                     qe_new = - rain_routing(h_e, wse_e, wse0,
                                             dt, dx, v_rout)
                 # flow routing going E, i.e positive
-                elif hf_e <= hf_min and  qdire == 1 and wse0 > wse_e:
+                elif qdire == 1 and wse0 > wse_e:
                     qe_new = rain_routing(h0, wse0, wse_e,
                                           dt, dx, v_rout)
                 else:
@@ -205,12 +216,12 @@ def solve_q(DTYPE_t [:, :] arr_dire, DTYPE_t [:, :] arr_dirs,
                                          qm1=arrp_qs[rp-1,cp], q0=qs,
                                          qp1=arrp_qs[rp+1,cp], q_norm=qs_vect,
                                          theta=theta, g=g, dt=dt, cell_len=dy)
-                # flow routing going N, i.e negative
-                elif hf_s <= hf_min and qdirs == 0 and wse_s > wse0:
+                # below hf_min: rain routing. flow going N, i.e negative
+                elif qdirs == 0 and wse_s > wse0:
                     qs_new = - rain_routing(h_s, wse_s, wse0,
                                             dt, dy, v_rout)
                 # flow routing going S, i.e positive
-                elif hf_s <= hf_min and  qdirs == 1 and wse0 > wse_s:
+                elif qdirs == 1 and wse0 > wse_s:
                     qs_new = rain_routing(h0, wse0, wse_s,
                                           dt, dy, v_rout)
                 else:
@@ -281,18 +292,24 @@ def solve_h(DTYPE_t [:, :] arr_ext,
             DTYPE_t [:, :] arr_hfn, DTYPE_t [:, :] arr_hfs,
             DTYPE_t [:, :] arr_v, DTYPE_t [:, :] arr_vdir,
             DTYPE_t [:, :] arr_vmax, DTYPE_t [:, :] arr_fr,
+            DTYPE_t [:] arr_row_hmax,
             float dx, float dy, float dt, float g):
     '''Update the water depth and max depth
     Adjust water depth according to in-domain 'boundary' condition
     Calculate vel. magnitude in m/s, direction in degree and Froude number.
+    Store the maximum new depth of each row (at least zero) in arr_row_hmax.
+    Return the number of cells where the new depth is NaN.
     '''
     cdef int rmax, cmax, r, c
+    cdef int nan_cells = 0
     cdef float qext, qe, qw, qn, qs, h, q_sum, h_new, hmax, bct, bcv
+    cdef float row_hmax
     cdef float hfe, hfs, hfw, hfn, ve, vw, vn, vs, vx, vy, v, vdir
 
     rmax = arr_qe.shape[0]
     cmax = arr_qe.shape[1]
-    for r in prange(rmax, nogil=True):
+    for r in prange(rmax, nogil=True, schedule='static'):
+        row_hmax = 0.
         for c in range(cmax):
             qext = arr_ext[r, c]
             qe = arr_qe[r, c]
@@ -316,8 +333,12 @@ def solve_h(DTYPE_t [:, :] arr_ext,
                 # Positive if water enters the domain
                 arr_hfix[r, c] += bcv - h_new
                 h_new = bcv
+            # Count NULL cells, so no other sweep is needed to find them
+            if c_isnan(h_new):
+                nan_cells += 1
             # Update max depth array
             arr_hmax[r, c] = max(h_new, hmax)
+            row_hmax = max(h_new, row_hmax)
             # Update depth array
             arr_h[r, c] = h_new
 
@@ -358,6 +379,8 @@ def solve_h(DTYPE_t [:, :] arr_ext,
 
             # Froude number
             arr_fr[r, c] = v / c_sqrt(g * h_new)
+        arr_row_hmax[r] = row_hmax
+    return nan_cells
 
 
 @cython.wraparound(False)  # Disable negative index check
@@ -372,7 +395,7 @@ def set_ext_array(DTYPE_t [:, :] arr_qext, DTYPE_t [:, :] arr_drain,
 
     rmax = arr_qext.shape[0]
     cmax = arr_qext.shape[1]
-    for r in prange(rmax, nogil=True):
+    for r in prange(rmax, nogil=True, schedule='static'):
         for c in range(cmax):
             arr_ext[r, c] = arr_qext[r, c] + arr_drain[r, c]
 
@@ -390,9 +413,9 @@ def inf_user(DTYPE_t [:, :] arr_h,
 
     rmax = arr_h.shape[0]
     cmax = arr_h.shape[1]
-    for r in prange(rmax, nogil=True):
+    dt_h = dt / 3600.  # dt from sec to hours
+    for r in prange(rmax, nogil=True, schedule='static'):
         for c in range(cmax):
-            dt_h = dt / 3600.  # dt from sec to hours
             # cap the rate
             arr_inf_out[r, c] = cap_inf_rate(dt_h, arr_h[r, c], arr_inf_in[r, c])
 
@@ -410,9 +433,9 @@ def inf_ga(DTYPE_t [:, :] arr_h, DTYPE_t [:, :] arr_eff_por,
     cdef float dt_h, infrate, avail_porosity, poros_cappress, conduct
     rmax = arr_h.shape[0]
     cmax = arr_h.shape[1]
-    for r in prange(rmax, nogil=True):
+    dt_h = dt / 3600.  # dt from sec to hours
+    for r in prange(rmax, nogil=True, schedule='static'):
         for c in range(cmax):
-            dt_h = dt / 3600.  # dt from sec to hours
             conduct = arr_conduct[r, c]
             avail_porosity = arr_eff_por[r, c] - arr_water_soil_content[r, c]
             poros_cappress = avail_porosity * arr_pressure[r, c]
@@ -449,6 +472,6 @@ def populate_stat_array(DTYPE_t [:, :] arr, DTYPE_t [:, :] arr_stat,
     cdef int rmax, cmax, r, c
     rmax = arr.shape[0]
     cmax = arr.shape[1]
-    for r in prange(rmax, nogil=True):
+    for r in prange(rmax, nogil=True, schedule='static'):
         for c in range(cmax):
             arr_stat[r, c] += arr[r, c] * conv_factor * time_diff
@@ -129,6 +129,9 @@ class RasterDomain():
                               'in_q': 'st_inflow', 'capped_losses': 'st_losses',
                               'n_drain': 'st_ndrain'}
         self.k_all = self.k_input + self.k_internal + self.k_stats
+        # flow direction arrays only hold small integer codes
+        self.k_dir = ['dire', 'dirs']
+        self.dir_dtype = np.int8
         # last update of statistical map entry
         self.stats_update_time = dict.fromkeys(self.k_stats)
 
@@ -208,7 +211,11 @@ class RasterDomain():
         the unpadded arrays are a slice of the padded ones
         """
         for k in self.arr.keys():
-            self.arr[k], self.arrp[k] = self.pad_array(self.zeros_array())
+            if k in self.k_dir:
+                arr = np.zeros(shape=self.shape, dtype=self.dir_dtype)
+            else:
+                arr = self.zeros_array()
+            self.arr[k], self.arrp[k] = self.pad_array(arr)
         return self
 
     def update_mask(self, arr):
@@ -45,6 +45,12 @@ class SurfaceFlowSimulation():
         self.cell_surf = self.dx * self.dy
 
         self._dt = None
+        # number of NULL cells found by the last depth update
+        self.nan_cells = 0
+        # maximum depth of each row, populated by the depth update
+        self.arr_row_hmax = np.zeros(shape=domain.shape[0],
+                                     dtype=domain.dtype)
+        self.maxh = None
 
         # Slices for upstream and downstream cells on a padded array
         self.su = slice(None, -2)
@@ -68,30 +74,15 @@ class SurfaceFlowSimulation():
         self.s_boundary = Boundary(self.dx, self.dy, boundary_pos='S')
 
     def update_flow_dir(self):
-        ''' Return arrays of flow directions used for rain routing
-        each cell is assigned a direction in which it will drain
+        ''' Populate the int8 arrays of flow directions used for rain routing
+        each cell is assigned a direction code in which it will drain
         0: the flow is going dowstream, index-wise
         1: the flow is going upstream, index-wise
         -1: no routing happening on that face
         '''
-        # get a padded array
-        arrp_z = self.dom.get_padded('z')
-        # define differences in Z
-        z0 = arrp_z[1:-1, 1:-1]
-        zN = arrp_z[0:-2, 1:-1]
-        zS = arrp_z[2:, 1:-1]
-        zE = arrp_z[1:-1, 2:]
-        zW = arrp_z[1:-1, 0:-2]
-        dN = z0 - zN
-        dE = z0 - zE
-        dS = z0 - zS
-        dW = z0 - zW
-        # maximum altitude difference
-        arr_max_dz = np.maximum(np.maximum(dN, dS), np.maximum(dE, dW))
-        # y direction
-        flow.flow_dir(arr_max_dz[self.s_j_0], dN, dS, self.dom.get('dirs'))
-        # x direction
-        flow.flow_dir(arr_max_dz[self.s_i_0], dW, dE, self.dom.get('dire'))
+        flow.flow_dir(arrp_z=self.dom.get_padded('z'),
+                      arr_dire=self.dom.get('dire'),
+                      arr_dirs=self.dom.get('dirs'))
         return self
 
     def step(self):
@@ -102,8 +93,8 @@ class SurfaceFlowSimulation():
         self.apply_boundary_conditions()
         self.update_h()
         # in case of NaN/NULL cells, raise a NullError
-        self.arr_err = np.isnan(self.dom.get('h'))
-        if np.any(self.arr_err):
+        if self.nan_cells:
+            self.arr_err = np.isnan(self.dom.get('h'))
             raise NullError
         self.swap_flow_arrays()
         end_time = time.time()
@@ -115,8 +106,14 @@ class SurfaceFlowSimulation():
         The formula #15 in almeida et al (2012) has been modified to
         accomodate non-square cells
         The time-step is limited by the maximum time-step dtmax.
+        The maximum depth found by the last depth update is used only
+        once, as other processes could change the depth afterwards.
         """
-        maxh = self.dom.amax('h')  # max depth in domain
+        if self.maxh is None:
+            maxh = self.dom.amax('h')  # max depth in domain
+        else:
+            maxh = self.maxh
+            self.maxh = None
         min_dim = min(self.dx, self.dy)
         if maxh > 0:
             dt = self.cfl * (min_dim / (math.sqrt(self.g * maxh)))
@@ -162,20 +159,26 @@ class SurfaceFlowSimulation():
         assert (hflow_west.shape == hflow_east.shape ==
                 hflow_north.shape == hflow_south.shape)
 
-        flow.solve_h(arr_ext=self.dom.get('ext'),
-                     arr_qe=flow_east, arr_qw=flow_west,
-                     arr_qn=flow_north, arr_qs=flow_south,
-                     arr_bct=self.dom.get('bct'), arr_bcv=self.dom.get('bcv'),
-                     arr_h=self.dom.get('h'), arr_hmax=self.dom.get('hmax'),
-                     arr_hfix=self.dom.get('st_bound'),
-                     arr_herr=self.dom.get('st_herr'),
-                     arr_hfe=hflow_east, arr_hfw=hflow_west,
-                     arr_hfn=hflow_north, arr_hfs=hflow_south,
-                     arr_v=self.dom.get('v'), arr_vdir=self.dom.get('vdir'),
-                     arr_vmax=self.dom.get('vmax'),
-                     arr_fr=self.dom.get('fr'),
-                     dx=self.dx, dy=self.dy, dt=self._dt, g=self.g)
-        assert not np.any(self.dom.get('h') < 0)
+        self.nan_cells = flow.solve_h(
+            arr_ext=self.dom.get('ext'),
+            arr_qe=flow_east, arr_qw=flow_west,
+            arr_qn=flow_north, arr_qs=flow_south,
+            arr_bct=self.dom.get('bct'), arr_bcv=self.dom.get('bcv'),
+            arr_h=self.dom.get('h'), arr_hmax=self.dom.get('hmax'),
+            arr_hfix=self.dom.get('st_bound'),
+            arr_herr=self.dom.get('st_herr'),
+            arr_hfe=hflow_east, arr_hfw=hflow_west,
+            arr_hfn=hflow_north, arr_hfs=hflow_south,
+            arr_v=self.dom.get('v'), arr_vdir=self.dom.get('vdir'),
+            arr_vmax=self.dom.get('vmax'),
+            arr_fr=self.dom.get('fr'),
+            arr_row_hmax=self.arr_row_hmax,
+            dx=self.dx, dy=self.dy, dt=self._dt, g=self.g)
+        # max depth in domain, from the per-row maxima
+        self.maxh = np.amax(self.arr_row_hmax)
+        # reduction without a temporary boolean array.
+        # fmin ignores NaN, as they are handled in step()
+        assert not np.fmin.reduce(self.dom.get('h'), axis=None) < 0
         return self
 
     def solve_q(self):
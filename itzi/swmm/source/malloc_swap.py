@@ -1,14 +1,21 @@
-from glob import glob
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
-files = glob("./*.c")
-for filepath in files:
-    # Read in the file
-    with open(filepath, "r") as file:
-        filedata = file.read()
+OLD_INCLUDE = b"<malloc.h>"
+NEW_INCLUDE = b"<stdlib.h>"
 
-    # Replace the target string
-    filedata = filedata.replace("<malloc.h>", "<stdlib.h>")
 
-    # Write the file out again
-    with open(filepath, "w") as file:
-        file.write(filedata)
\ No newline at end of file
+def swap_include(filepath):
+    # Work on bytes: the sources are not guaranteed to be valid UTF-8
+    filedata = filepath.read_bytes()
+
+    # Only rewrite the files that contain the target string
+    if OLD_INCLUDE not in filedata:
+        return
+
+    filepath.write_bytes(filedata.replace(OLD_INCLUDE, NEW_INCLUDE))
+
+
+# The work is I/O-bound: process the files concurrently
+with ThreadPoolExecutor() as executor:
+    list(executor.map(swap_include, Path(".").glob("*.c")))
@@ -4,10 +4,12 @@
 import sys
 import os
 import io
+import tempfile
 from setuptools import setup, find_packages
 from setuptools.extension import Extension
 from setuptools.dist import Distribution
 from setuptools.command.build_ext import build_ext
+from distutils.errors import CompileError, DistutilsOptionError
 try:
     import numpy as np
 except ImportError:
@@ -15,6 +17,8 @@ except ImportError:
 
 
 SWMM_SOURCE = 'itzi/swmm/source/'
+# directory of the profiles used by profile-guided optimization
+PGO_DIR = os.path.abspath('pgo')
 
 
 def get_version():
@@ -65,23 +69,79 @@ REQUIRES = ['pyinstrument', 'networkx == 1.11', 'grass-session']
 
 # Set arguments according to compiler
 copt =  {'msvc': ['/openmp', '/Ox'],
-         'mingw32' : ['-O3', '-w', '-fopenmp', '-lgomp', '-lpthread'],
-         'unix' : ['-O3', '-w', '-Xpreprocessor', '-fopenmp']
+         'mingw32' : ['-O3', '-w', '-funroll-loops',
+                      '-fopenmp', '-lgomp', '-lpthread'],
+         'unix' : ['-O3', '-w', '-funroll-loops', '-Xpreprocessor', '-fopenmp']
          }
 lopt =  {'mingw32' : ['-lgomp', '-lpthread'],
          'unix' : ['-lgomp']
          }
+# tuning for the build machine, used with --native if accepted by the compiler
+copt_native = {'mingw32': ['-march=native'],
+               'unix': ['-march=native']
+               }
+
+
+def has_flag(compiler, flag):
+    """Return True if the compiler accepts the given flag
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        src = os.path.join(tmp_dir, 'flag_check.c')
+        with open(src, 'w') as f:
+            f.write('int main(void) { return 0; }\n')
+        try:
+            compiler.compile([src], output_dir=tmp_dir, extra_postargs=[flag])
+        except CompileError:
+            return False
+    return True
+
 
 class build_ext_compiler_check(build_ext):
+    """Set the compiler arguments.
+    With --pgo=generate, the extensions are instrumented.
+    Running a representative simulation then writes the profiles in PGO_DIR.
+    With --pgo=use, the extensions are rebuilt using those profiles.
+    With --native, the extensions are tuned for the CPU of the build machine,
+    and might not run on other machines.
+    """
+    user_options = build_ext.user_options + [
+        ('pgo=', None,
+         "profile-guided optimization step: 'generate' or 'use'"),
+        ('native', None,
+         "tune the extensions for the CPU of the build machine")]
+    boolean_options = build_ext.boolean_options + ['native']
+
+    def initialize_options(self):
+        build_ext.initialize_options(self)
+        self.pgo = None
+        self.native = False
+
+    def finalize_options(self):
+        build_ext.finalize_options(self)
+        if self.pgo not in (None, 'generate', 'use'):
+            raise DistutilsOptionError("--pgo must be 'generate' or 'use'")
+
     def build_extensions(self):
         compiler = self.compiler.compiler_type
         print("compiler: {}".format(compiler))
-        if compiler in copt:
-           for e in self.extensions:
-               e.extra_compile_args = copt[compiler]
-        if compiler in lopt:
-            for e in self.extensions:
-                e.extra_link_args = lopt[compiler]
+        compile_args = list(copt.get(compiler, []))
+        link_args = list(lopt.get(compiler, []))
+        if self.native:
+            for flag in copt_native.get(compiler, []):
+                if has_flag(self.compiler, flag):
+                    compile_args.append(flag)
+                else:
+                    print("flag not supported, ignored: {}".format(flag))
+        if self.pgo:
+            if compiler not in ('unix', 'mingw32'):
+                raise DistutilsOptionError("--pgo is not supported "
+                                           "with {}".format(compiler))
+            pgo_flag = '-fprofile-{}={}'.format(self.pgo, PGO_DIR)
+            compile_args.append(pgo_flag)
+            link_args.append(pgo_flag)
+        for e in self.extensions:
+            e.extra_compile_args = compile_args
+            e.extra_link_args = link_args
         build_ext.build_extensions(self)
 
 
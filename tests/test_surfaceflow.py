@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+"""
+from datetime import timedelta
+
+import pytest
+import numpy as np
+
+import itzi.flow as flow
+from itzi.rasterdomain import RasterDomain
+from itzi.surfaceflow import SurfaceFlowSimulation
+from itzi.itzi_error import NullError
+
+
+SIM_PARAM = {'dtmax': 5., 'cfl': .7, 'g': 9.80665, 'theta': .9,
+             'hmin': .005, 'slmax': .5, 'vrouting': .1}
+
+
+class DomainGeometry():
+    """Provide the region information RasterDomain reads from Igis
+    """
+    yr = 5
+    xr = 6
+    dx = 5.
+    dy = 5.
+
+    def get_npmask(self):
+        return np.zeros(shape=(self.yr, self.xr), dtype=np.bool_)
+
+
+@pytest.fixture
+def surface_sim():
+    """A SurfaceFlowSimulation on a flat, dry domain with closed boundaries
+    """
+    domain = RasterDomain(np.float32, DomainGeometry(), {}, {})
+    domain.get('n')[:] = 0.03
+    sim = SurfaceFlowSimulation(domain, SIM_PARAM)
+    sim.update_flow_dir()
+    sim.dt = timedelta(seconds=1)
+    return sim
+
+
+def test_step_raises_null_error(surface_sim):
+    """A NaN in the external flow should stop the simulation,
+    with arr_err marking the NULL cell
+    """
+    surface_sim.dom.get('ext')[2, 3] = np.nan
+    with pytest.raises(NullError):
+        surface_sim.step()
+    assert surface_sim.nan_cells == 1
+    expected_err = np.zeros(shape=surface_sim.dom.shape, dtype=np.bool_)
+    expected_err[2, 3] = True
+    assert np.array_equal(surface_sim.arr_err, expected_err)
+
+
+def test_step_without_null(surface_sim):
+    """Without NaN, no NULL cell should be reported
+    """
+    surface_sim.dom.get('ext')[:] = 1e-5
+    surface_sim.step()
+    assert surface_sim.nan_cells == 0
+    assert not np.any(np.isnan(surface_sim.dom.get('h')))
+
+
+def test_solve_h_row_hmax():
+    """The per-row maxima should give the maximum new depth,
+    ignoring NaN and never lower than zero
+    """
+    shape = (7, 9)
+    rng = np.random.default_rng(0)
+    arrays = {k: np.zeros(shape=shape, dtype=np.float32)
+              for k in ['qe', 'qw', 'qn', 'qs', 'bct', 'bcv', 'hmax',
+                        'hfix', 'herr', 'hfe', 'hfw', 'hfn', 'hfs',
+                        'v', 'vdir', 'vmax', 'fr']}
+    arr_h = rng.random(shape, dtype=np.float32)
+    arr_ext = rng.uniform(-1., 1., shape).astype(np.float32)
+    # a dry row and a NULL cell
+    arr_ext[3] = -10.
+    arr_ext[5, 2] = np.nan
+    arr_row_hmax = np.full(shape[0], -1., dtype=np.float32)
+    nan_cells = flow.solve_h(arr_ext=arr_ext,
+                             arr_qe=arrays['qe'], arr_qw=arrays['qw'],
+                             arr_qn=arrays['qn'], arr_qs=arrays['qs'],
+                             arr_bct=arrays['bct'], arr_bcv=arrays['bcv'],
+                             arr_h=arr_h, arr_hmax=arrays['hmax'],
+                             arr_hfix=arrays['hfix'],
+                             arr_herr=arrays['herr'],
+                             arr_hfe=arrays['hfe'], arr_hfw=arrays['hfw'],
+                             arr_hfn=arrays['hfn'], arr_hfs=arrays['hfs'],
+                             arr_v=arrays['v'], arr_vdir=arrays['vdir'],
+                             arr_vmax=arrays['vmax'], arr_fr=arrays['fr'],
+                             arr_row_hmax=arr_row_hmax,
+                             dx=5., dy=5., dt=.5, g=9.80665)
+    assert nan_cells == 1
+    assert arr_row_hmax[3] == 0.
+    assert np.amax(arr_row_hmax) == max(np.nanmax(arr_h), 0.)
+
+
+def test_solve_dt_maxh_used_once(surface_sim):
+    """solve_dt() should not reuse the depth maximum of an old update
+    """
+    surface_sim.dom.get('ext')[:] = 1e-5
+    surface_sim.step()
+    assert surface_sim.maxh is not None
+    surface_sim.solve_dt()
+    assert surface_sim.maxh is None
+    # depth changed by another process
+    surface_sim.dom.get('h')[1, 1] = 2.
+    surface_sim.solve_dt()
+    min_dim = min(surface_sim.dx, surface_sim.dy)
+    expected_dt = surface_sim.cfl * min_dim / np.sqrt(surface_sim.g * 2.)
+    assert np.isclose(surface_sim._dt, expected_dt)